@@ -15,9 +15,18 @@ from datetime import datetime
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
 
+from reverse_dns import PTRCache, SystemPTRResolver, BulkPTRResolver
+from output_files import COMPRESSION_SUFFIX, HAS_ZSTD, CompressedWriter, ExternalSorter, compress_blob
+
 BREAKPOINT_WIDTH = 1200   # 2 columns >= this width; stacked below otherwise
 MAX_THREADS = 2048        # slider upper bound
 
+PTR_BATCH_SIZE = 256      # IPs per PTR_LOOKUP task
+PTR_WORKERS = 8           # dedicated PTR lookup threads
+
+STOP_JOIN_TIMEOUT = 5.0   # seconds to wait for in-flight tasks before sorting on Stop
+
+
 class ASNScannerApp:
     def __init__(self, root: ctk.CTk):
         self.root = root
@@ -35,6 +44,7 @@ class ASNScannerApp:
         self.pause_flag = threading.Event()
         self.q = queue.Queue()           # GUI message queue (logs/progress)
         self.task_q = queue.Queue()      # Work queue (ASN_INIT / PREFIX_SCAN)
+        self.ptr_q = queue.Queue()       # PTR_LOOKUP batches, drained by their own pool
         self.lock = threading.Lock()     # Protect shared counters
 
         self.completed_asns = 0          # how many targets (ASN/IP) fully done
@@ -47,14 +57,31 @@ class ASNScannerApp:
         self.total_prefixes = 0
         self.processed_prefixes = 0
 
-        # Per-target pending prefix counter {target_key -> remaining_prefixes}
+        # Per-target pending task counter {target_key -> remaining PREFIX_SCAN/PTR_LOOKUP tasks}
         self.asn_pending = {}
 
+        # Reverse-DNS enrichment (resolver is built per scan; cache lives across scans)
+        self.ptr_resolver = None
+        self.ptr_cache = PTRCache()
+        self.ptr_domains = 0
+
+        # Output mode: compression + external sort/dedup of the single files {path -> ExternalSorter}
+        self.compression = "none"
+        self.sorters = {}
+        self.writers = {}                # path -> CompressedWriter (single files, unsorted)
+        self.outputs_closed = True       # writers closed / sorters merged for the last scan
+        self.finalizing = False
+        self.late_lock = threading.Lock()
+        self.late_lines = {}             # sorted path -> lines that arrived during its merge
+
         # UI vars
         self.save_single_file_var = ctk.BooleanVar(value=True)
         self.thread_var = ctk.IntVar(value=50)
         self.autoscroll_var = ctk.BooleanVar(value=True)
         self.wrap_var = ctk.BooleanVar(value=False)
+        self.ptr_enrich_var = ctk.BooleanVar(value=False)
+        self.compression_var = ctk.StringVar(value="None")
+        self.sort_output_var = ctk.BooleanVar(value=False)
 
         # Build UI
         self._build_ui()
@@ -129,6 +156,23 @@ class ASNScannerApp:
                                               variable=self.save_single_file_var)
         self.single_file_cb.pack(side="left")
 
+        ptr_row = ctk.CTkFrame(self.step2, fg_color="transparent")
+        ptr_row.pack(fill="x", padx=8, pady=(0, 8))
+        self.ptr_cb = ctk.CTkCheckBox(ptr_row, text="Reverse-DNS enrichment (PTR)", variable=self.ptr_enrich_var)
+        self.ptr_cb.pack(side="left")
+        self.ptr_server_entry = ctk.CTkEntry(ptr_row, placeholder_text="System resolver, or DNS server host[:port]")
+        self.ptr_server_entry.pack(side="left", fill="x", expand=True, padx=(8, 0))
+
+        out_row = ctk.CTkFrame(self.step2, fg_color="transparent")
+        out_row.pack(fill="x", padx=8, pady=(0, 8))
+        ctk.CTkLabel(out_row, text="Compression:").pack(side="left")
+        self.compression_seg = ctk.CTkSegmentedButton(out_row, values=["None", "gzip", "zstd"],
+                                                      variable=self.compression_var)
+        self.compression_seg.pack(side="left", padx=(8, 0))
+        self.sort_output_cb = ctk.CTkCheckBox(out_row, text="Sort & dedup single files (low RAM)",
+                                              variable=self.sort_output_var)
+        self.sort_output_cb.pack(side="left", padx=(12, 0))
+
         threads_box = ctk.CTkFrame(self.step2, fg_color="transparent")
         threads_box.pack(fill="x", padx=8, pady=(0, 10))
         ctk.CTkLabel(threads_box, text="Threads:").pack(side="left")
@@ -400,12 +444,78 @@ class ASNScannerApp:
         return {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36"}
 
     def save_to_file(self, data, filename):
+        if not data:
+            return
         try:
-            with open(filename, "a", encoding="utf-8") as f:
-                for line in data:
-                    f.write(line + "\n")
+            sorter = self.sorters.get(filename)
+            if sorter is not None:
+                try:
+                    sorter.add(data)
+                    return
+                except RuntimeError:
+                    # Worker outlived Stop: hold lines until the merge is written, then append
+                    with self.late_lock:
+                        late = self.late_lines.get(filename)
+                        if late is not None:
+                            late.extend(data)
+                            return
+                    self.q.put(("log", f"[!] {len(data)} late line(s) appended unsorted to {filename}"))
+            writer = self.writers.get(filename)
+            if writer is not None:
+                writer.write(data)
+                return
+            blob = compress_blob("".join(line + "\n" for line in data), self.compression)
+            with open(filename, "ab") as f:
+                f.write(blob)
         except Exception as e:
-            self.log(f"[!] Write error {filename}: {e}")
+            self.q.put(("log", f"[!] Write error {filename}: {e}"))
+
+    def _out_name(self, name):
+        suffix = COMPRESSION_SUFFIX[self.compression]
+        return name if not suffix or name.endswith(suffix) else name + suffix
+
+    def _domains_target(self, prefix):
+        if self.save_single_file_var.get():
+            return self.filename_domains
+        return self._out_name(f"domains_{prefix.replace('/', '_')}.txt")
+
+    def _make_ptr_resolver(self):
+        spec = (self.ptr_server_entry.get() or "").strip()
+        if spec:
+            return BulkPTRResolver.from_spec(spec)
+        return SystemPTRResolver()
+
+    def resolve_ptr_batch(self, ips):
+        # Cache first; only misses reach the resolver
+        names = {}
+        misses = []
+        for ip in ips:
+            cached = self.ptr_cache.get(ip)
+            if cached is None:
+                misses.append(ip)
+            else:
+                names[ip] = cached
+        if misses:
+            try:
+                resolved = self.ptr_resolver.resolve_many(misses, stop=self.stop_flag)
+            except Exception as e:
+                self.q.put(("log", f"[!] PTR lookup error ({len(misses)} IPs): {e}"))
+                resolved = {}
+            for ip, (ptrs, ttl) in resolved.items():
+                self.ptr_cache.put(ip, ptrs, ttl)
+                names[ip] = ptrs
+        return names
+
+    def _finish_task(self, asn_key):
+        # Decrement pending; if reaches 0, mark target complete
+        with self.lock:
+            if asn_key in self.asn_pending:
+                self.asn_pending[asn_key] -= 1
+                if self.asn_pending[asn_key] <= 0:
+                    del self.asn_pending[asn_key]
+                    self.completed_asns += 1
+                    self.q.put(("log", f"[✓] {asn_key} finished."))
+                    self.q.put(("progress", self.completed_asns, self.total_asns))
 
     def log(self, text):
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -459,11 +569,18 @@ class ASNScannerApp:
                 ips, domains = self.extract_dns_records_from_prefix(prefix)
                 if self.save_single_file_var.get():
                     self.save_to_file(ips, self.filename_ips)
-                    self.save_to_file(domains, self.filename_domains)
                 else:
-                    prefix_clean = prefix.replace("/", "_")
-                    self.save_to_file(ips, f"ips_{prefix_clean}.txt")
-                    self.save_to_file(domains, f"domains_{prefix_clean}.txt")
+                    self.save_to_file(ips, self._out_name(f"ips_{prefix.replace('/', '_')}.txt"))
+                self.save_to_file(domains, self._domains_target(prefix))
+
+                # Hand discovered IPs to the PTR stage while scanning continues
+                if self.ptr_resolver is not None and ips:
+                    batches = [ips[i:i + PTR_BATCH_SIZE] for i in range(0, len(ips), PTR_BATCH_SIZE)]
+                    with self.lock:
+                        if asn_key in self.asn_pending:
+                            self.asn_pending[asn_key] += len(batches)
+                    for batch in batches:
+                        self.ptr_q.put(("PTR_LOOKUP", asn_key, prefix, batch, set(domains)))
 
                 # Update counters
                 with self.lock:
@@ -471,18 +588,39 @@ class ASNScannerApp:
                     p_processed, p_total = self.processed_prefixes, self.total_prefixes
                 self.q.put(("prefix", p_processed, p_total))
 
-                # Decrement pending; if reaches 0, mark ASN complete
-                with self.lock:
-                    if asn_key in self.asn_pending:
-                        self.asn_pending[asn_key] -= 1
-                        if self.asn_pending[asn_key] <= 0:
-                            del self.asn_pending[asn_key]
-                            self.completed_asns += 1
-                            self.q.put(("log", f"[✓] {asn_key} finished."))
-                            self.q.put(("progress", self.completed_asns, self.total_asns))
+                self._finish_task(asn_key)
 
             self.task_q.task_done()
 
+    def ptr_worker(self):
+        # Runs next to the scan workers so PTR batches never wait behind queued prefixes
+        while not self.stop_flag.is_set():
+            try:
+                _, asn_key, prefix, ips, known = self.ptr_q.get(timeout=0.3)
+            except queue.Empty:
+                continue
+            while self.pause_flag.is_set() and not self.stop_flag.is_set():
+                time.sleep(0.2)
+            if self.stop_flag.is_set():
+                self.ptr_q.task_done()
+                continue
+
+            new_domains = []
+            for ip, ptrs in self.resolve_ptr_batch(ips).items():
+                for name in ptrs:
+                    name = name.rstrip(".").lower()
+                    if name and name not in known:
+                        known.add(name)
+                        new_domains.append(name)
+                        self.q.put(("log", f"[+] PTR {ip} → {name}"))
+            if new_domains:
+                self.save_to_file(new_domains, self._domains_target(prefix))
+                with self.lock:
+                    self.ptr_domains += len(new_domains)
+
+            self._finish_task(asn_key)
+            self.ptr_q.task_done()
+
     # ====================== GUI update / progress ======================
     def update_gui_loop(self):
         try:
@@ -507,6 +645,9 @@ class ASNScannerApp:
                     self.lbl_prefixes.configure(text=f"{processed} / {total}")
                 elif msg[0] == "log":
                     self.log(msg[1])
+                elif msg[0] == "finalized":
+                    self.finalizing = False
+                    self.start_btn.configure(state="normal")
         except queue.Empty:
             pass
         self.root.after(200, self.update_gui_loop)
@@ -528,6 +669,9 @@ class ASNScannerApp:
 
     # ============================ Control ==============================
     def start_scanning(self):
+        if self.finalizing:
+            self.log("[!] Still sorting the previous results, please wait.")
+            return
         self.stop_flag.clear()
         self.pause_flag.clear()
 
@@ -537,12 +681,14 @@ class ASNScannerApp:
             self.completed_asns = 0
             self.total_prefixes = 0
             self.processed_prefixes = 0
-        while not self.task_q.empty():
-            try:
-                self.task_q.get_nowait()
-                self.task_q.task_done()
-            except queue.Empty:
-                break
+            self.ptr_domains = 0
+        for tq in (self.task_q, self.ptr_q):
+            while not tq.empty():
+                try:
+                    tq.get_nowait()
+                    tq.task_done()
+                except queue.Empty:
+                    break
         self.q.put(("prefix", 0, 0))
 
         raw = self.asn_text.get("1.0", "end").strip()
@@ -556,7 +702,13 @@ class ASNScannerApp:
             self.log("[!] No input detected. Add ASNs/IPs (one per line).")
             return
 
-        self.filename_domains, self.filename_ips = self._ask_output_filenames()
+        self.compression = self.compression_var.get().lower()
+        if self.compression == "zstd" and not HAS_ZSTD:
+            self.log("[!] zstd needs the 'zstandard' package; falling back to gzip.")
+            self.compression = "gzip"
+
+        domains_name, ips_name = self._ask_output_filenames()
+        self.filename_domains, self.filename_ips = self._out_name(domains_name), self._out_name(ips_name)
         for path in (self.filename_domains, self.filename_ips):
             try:
                 if os.path.exists(path):
@@ -564,6 +716,17 @@ class ASNScannerApp:
             except Exception as e:
                 self.log(f"[!] Could not reset {path}: {e}")
 
+        self.sorters = {}
+        self.writers = {}
+        if self.save_single_file_var.get():
+            for path in (self.filename_domains, self.filename_ips):
+                if self.sort_output_var.get():
+                    self.sorters[path] = ExternalSorter()
+                elif self.compression != "none":
+                    self.writers[path] = CompressedWriter(path, self.compression)
+        self.outputs_closed = False
+
+        self.ptr_resolver = self._make_ptr_resolver() if self.ptr_enrich_var.get() else None
         self.start_time = time.time()
 
         # Enqueue tasks:
@@ -588,6 +751,11 @@ class ASNScannerApp:
             t = threading.Thread(target=self.worker, daemon=True)
             t.start()
             self._workers.append(t)
+        if self.ptr_resolver is not None:
+            for _ in range(PTR_WORKERS):
+                t = threading.Thread(target=self.ptr_worker, daemon=True)
+                t.start()
+                self._workers.append(t)
 
         # UI labels
         self.lbl_total.configure(text=str(self.total_asns))
@@ -596,23 +764,73 @@ class ASNScannerApp:
         self.lbl_threads.configure(text=str(n_threads))
         self.start_btn.configure(state="disabled")
         self.log(f"[▶] Scan started with {n_threads} thread(s) | {self.total_asns} target(s)")
+        if self.ptr_resolver is not None:
+            backend = "system resolver" if isinstance(self.ptr_resolver, SystemPTRResolver) \
+                else f"{self.ptr_resolver.server}:{self.ptr_resolver.port}"
+            self.log(f"[▶] Reverse-DNS enrichment on ({backend})")
 
         # Poll end
         self.root.after(500, self._check_finished)
 
     def _check_finished(self):
         if self.stop_flag.is_set():
-            self.start_btn.configure(state="normal")
+            if not self._finalize_outputs(wait_workers=True):
+                self.start_btn.configure(state="normal")
             return
         if self.completed_asns >= self.total_asns and self.total_asns > 0:
+            if self.ptr_resolver is not None:
+                self.log(f"[✓] Reverse-DNS added {self.ptr_domains} domain(s).")
             self.log("[✓] Scan finished.")
-            self.start_btn.configure(state="normal")
+            if not self._finalize_outputs(wait_workers=False):
+                self.start_btn.configure(state="normal")
             return
         self.root.after(500, self._check_finished)
 
+    def _finalize_outputs(self, wait_workers):
+        # Closes compressed streams, then merges sorter runs into the final files
+        # off the GUI thread; False if nothing is left running
+        if self.outputs_closed:
+            return self.finalizing
+        self.outputs_closed = True
+        for writer in self.writers.values():
+            try:
+                writer.close()
+            except Exception as e:
+                self.log(f"[!] Write error {writer.path}: {e}")
+        if not self.sorters:
+            return False
+        sorters = dict(self.sorters)
+        self.finalizing = True
+        workers = list(getattr(self, "_workers", []))
+
+        def run():
+            if wait_workers:
+                self.q.put(("log", "[…] Waiting for in-flight requests before sorting…"))
+                deadline = time.monotonic() + STOP_JOIN_TIMEOUT
+                for t in workers:
+                    t.join(max(0.0, deadline - time.monotonic()))
+            for path, sorter in sorters.items():
+                self.q.put(("log", f"[…] Sorting & deduplicating {path}…"))
+                with self.late_lock:
+                    self.late_lines[path] = []
+                try:
+                    count = sorter.finish(path, self.compression)
+                    self.q.put(("log", f"[✓] {path}: {count} unique line(s)."))
+                except Exception as e:
+                    self.q.put(("log", f"[!] Sort error {path}: {e}"))
+                with self.late_lock:
+                    late = self.late_lines.pop(path)
+                if late:
+                    self.save_to_file(late, path)   # sorter is closed: appended unsorted, logged
+            self.q.put(("finalized",))
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
     def stop_scanning(self):
         self.stop_flag.set()
-        self.start_btn.configure(state="normal")
+        if not self.finalizing and self.outputs_closed:
+            self.start_btn.configure(state="normal")
         self.log("[!] Stop requested.")
 
     def toggle_pause(self):
@@ -0,0 +1,181 @@
+# output_files.py
+# Output helpers: gzip/zstd compression and a bounded-memory external sort -u.
+
+import atexit
+import gzip
+import heapq
+import os
+import shutil
+import tempfile
+import threading
+
+try:
+    import zstandard      # optional: zstd output
+except ImportError:
+    zstandard = None
+
+HAS_ZSTD = zstandard is not None
+
+COMPRESSION_SUFFIX = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+SORT_BUFFER_LINES = 500_000   # lines held in RAM before spilling a sorted run
+SORT_MERGE_FAN_IN = 64        # max runs opened at once while merging
+GZIP_LEVEL = 6
+
+_zstd_local = threading.local()   # ZstdCompressor is not thread-safe; one per thread
+_live_tmp_dirs = set()            # sorter temp dirs not yet merged
+
+
+@atexit.register
+def _cleanup_tmp_dirs():
+    # Window closed mid-sort: daemon threads die, so drop their spill runs here
+    for path in list(_live_tmp_dirs):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def compress_blob(text, compression):
+    # One self-contained gzip member / zstd frame per call, so appends from
+    # concurrent workers stay a single write() and the file stays decodable
+    data = text.encode("utf-8")
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    if compression == "zstd":
+        cctx = getattr(_zstd_local, "cctx", None)
+        if cctx is None:
+            cctx = _zstd_local.cctx = zstandard.ZstdCompressor()
+        return cctx.compress(data)
+    return data
+
+
+def open_output(path, compression):
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8")
+    if compression == "zstd":
+        return zstandard.open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8")
+
+
+class CompressedWriter:
+    """One compression stream per output file for the whole scan, so batches
+    share the compressor's window. Writes are serialized under a lock; after
+    close(), late writes are appended as self-contained members/frames."""
+
+    def __init__(self, path, compression):
+        self.path = path
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._raw = open(path, "ab")
+        if compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=GZIP_LEVEL)
+        else:
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw)
+        self._closed = False
+
+    def write(self, lines):
+        text = "".join(line + "\n" for line in lines)
+        with self._lock:
+            if not self._closed:
+                self._stream.write(text.encode("utf-8"))
+                return
+        with open(self.path, "ab") as f:
+            f.write(compress_blob(text, self.compression))
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._stream.close()
+            self._raw.close()
+
+
+class ExternalSorter:
+    """Bounded-memory `sort -u`: buffers lines, spills sorted unique runs to
+    gzip temp files (system temp dir by default) as it goes, then k-way merges
+    them into the final output."""
+
+    def __init__(self, tmp_parent=None, buffer_lines=SORT_BUFFER_LINES, fan_in=SORT_MERGE_FAN_IN):
+        self.buffer_lines = buffer_lines
+        self.fan_in = max(2, fan_in)
+        self.tmp_dir = tempfile.mkdtemp(prefix="asn_sort_", dir=tmp_parent or None)
+        _live_tmp_dirs.add(self.tmp_dir)
+        self._buf = []
+        self._runs = []
+        self._seq = 0
+        self._spilling = 0           # spills sorted/written outside the lock
+        self._closed = False
+        self._lock = threading.Lock()
+        self._spilled = threading.Condition(self._lock)
+
+    def add(self, lines):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ExternalSorter.add() called after finish()")
+            self._buf.extend(lines)
+            if len(self._buf) < self.buffer_lines:
+                return
+            buf, self._buf = self._buf, []
+            self._spilling += 1
+        # Sort/write outside the lock so other workers keep buffering
+        run = None
+        try:
+            run = self._write_run(sorted(set(buf)))
+        finally:
+            with self._lock:
+                if run is not None:
+                    self._runs.append(run)
+                self._spilling -= 1
+                self._spilled.notify_all()
+
+    def _new_run_path(self):
+        with self._lock:
+            self._seq += 1
+            return os.path.join(self.tmp_dir, f"run_{self._seq:06d}.gz")
+
+    def _write_run(self, lines):
+        path = self._new_run_path()
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=1) as f:
+            for line in lines:
+                f.write(line + "\n")
+        return path
+
+    @staticmethod
+    def _read_run(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+    @staticmethod
+    def _merge_unique(iterables, out):
+        count = 0
+        prev = None
+        for line in heapq.merge(*iterables):
+            if line != prev:
+                out.write(line + "\n")
+                prev = line
+                count += 1
+        return count
+
+    def finish(self, path, compression):
+        """Writes the sorted, unique lines to `path`; returns how many."""
+        try:
+            with self._lock:
+                self._closed = True
+                while self._spilling:
+                    self._spilled.wait()
+                buf, self._buf = self._buf, []
+                runs, self._runs = self._runs, []
+            # Collapse runs until a single merge stays within the fan-in
+            while len(runs) >= self.fan_in:
+                group, runs = runs[:self.fan_in], runs[self.fan_in:]
+                merged = self._new_run_path()
+                with gzip.open(merged, "wt", encoding="utf-8", compresslevel=1) as f:
+                    self._merge_unique([self._read_run(r) for r in group], f)
+                for r in group:
+                    os.remove(r)
+                runs.append(merged)
+            sources = [self._read_run(r) for r in runs] + [iter(sorted(set(buf)))]
+            with open_output(path, compression) as out:
+                return self._merge_unique(sources, out)
+        finally:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+            _live_tmp_dirs.discard(self.tmp_dir)
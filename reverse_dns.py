@@ -0,0 +1,186 @@
+# reverse_dns.py
+# Reverse-DNS (PTR) enrichment: TTL/LRU cache + pluggable resolvers.
+# Resolvers expose resolve_many(ips, stop=None) -> {ip: (names, ttl)}.
+
+import random
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+PTR_CACHE_SIZE = 100_000  # LRU capacity (IPs)
+PTR_DEFAULT_TTL = 3600    # seconds, when the backend gives no TTL
+PTR_NEGATIVE_TTL = 300    # seconds, for IPs without a PTR record
+
+
+def reverse_name(ip):
+    return ".".join(reversed(ip.split("."))) + ".in-addr.arpa"
+
+
+class PTRCache:
+    """Thread-safe TTL + LRU cache: ip -> list of PTR names (empty = negative)."""
+
+    def __init__(self, maxsize=PTR_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()   # ip -> (expires_at, names)
+        self._lock = threading.Lock()
+
+    def get(self, ip):
+        with self._lock:
+            entry = self._data.get(ip)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[ip]
+                return None
+            self._data.move_to_end(ip)
+            return entry[1]
+
+    def put(self, ip, names, ttl):
+        with self._lock:
+            self._data[ip] = (time.monotonic() + ttl, names)
+            self._data.move_to_end(ip)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SystemPTRResolver:
+    """Resolves PTR records one by one through the OS resolver."""
+
+    # Definite "no such name" answers; anything else (TRY_AGAIN, ...) is transient
+    NEGATIVE_HERRNO = (1, 4)   # HOST_NOT_FOUND, NO_DATA
+    NEGATIVE_GAIERRNO = tuple(getattr(socket, n) for n in ("EAI_NONAME", "EAI_NODATA") if hasattr(socket, n))
+
+    def resolve_many(self, ips, stop=None):
+        # -> {ip: (names, ttl)}; IPs that failed transiently are omitted
+        results = {}
+        for ip in ips:
+            if stop is not None and stop.is_set():
+                break
+            try:
+                host, aliases, _ = socket.gethostbyaddr(ip)
+                results[ip] = ([host] + [a for a in aliases if a != host], PTR_DEFAULT_TTL)
+            except socket.herror as e:
+                if e.errno in self.NEGATIVE_HERRNO:
+                    results[ip] = ([], PTR_NEGATIVE_TTL)
+            except socket.gaierror as e:
+                if e.errno in self.NEGATIVE_GAIERRNO:
+                    results[ip] = ([], PTR_NEGATIVE_TTL)
+            except OSError:
+                pass
+        return results
+
+
+class BulkPTRResolver:
+    """Fires a whole batch of PTR queries over one UDP socket to a single
+    nameserver and collects the answers as they arrive."""
+
+    def __init__(self, server, port=53, timeout=2.0, retries=1):
+        self.server = server
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+
+    @classmethod
+    def from_spec(cls, spec):
+        host, _, port = spec.strip().rpartition(":")
+        if not host or not port.isdigit():
+            return cls(spec.strip())
+        return cls(host, int(port))
+
+    def resolve_many(self, ips, stop=None):
+        results = {}
+        pending = list(dict.fromkeys(ips))
+        server = (socket.gethostbyname(self.server), self.port)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for _ in range(self.retries + 1):
+                if not pending or (stop is not None and stop.is_set()):
+                    break
+                by_id = {}
+                for ip in pending:
+                    qid = random.randrange(0x10000)
+                    while qid in by_id:
+                        qid = random.randrange(0x10000)
+                    by_id[qid] = ip
+                    sock.sendto(self._build_query(qid, ip), server)
+                deadline = time.monotonic() + self.timeout
+                while by_id:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    sock.settimeout(left)
+                    try:
+                        data, addr = sock.recvfrom(4096)
+                    except socket.timeout:
+                        break
+                    except OSError:
+                        continue
+                    if addr[:2] != server:
+                        continue
+                    parsed = self._parse_response(data)
+                    if parsed is None or parsed[0] not in by_id:
+                        continue
+                    qid, qname, names, ttl = parsed
+                    # IDs are redrawn on retry, so a late reply may carry another IP's ID
+                    if qname.lower() != reverse_name(by_id[qid]):
+                        continue
+                    results[by_id.pop(qid)] = (names, ttl)
+                pending = list(by_id.values())
+        return results
+
+    @staticmethod
+    def _build_query(qid, ip):
+        qname = b"".join(bytes([len(p)]) + p.encode("ascii") for p in reverse_name(ip).split("."))
+        return struct.pack(">HHHHHH", qid, 0x0100, 1, 0, 0, 0) + qname + b"\x00" + struct.pack(">HH", 12, 1)
+
+    @staticmethod
+    def _read_name(data, offset):
+        labels = []
+        end = None
+        for _ in range(128):   # guard against compression loops
+            length = data[offset]
+            if length & 0xC0 == 0xC0:
+                if end is None:
+                    end = offset + 2
+                offset = ((length & 0x3F) << 8) | data[offset + 1]
+                continue
+            offset += 1
+            if length == 0:
+                break
+            labels.append(data[offset:offset + length].decode("ascii", errors="ignore"))
+            offset += length
+        return ".".join(labels), (end if end is not None else offset)
+
+    @classmethod
+    def _parse_response(cls, data):
+        # -> (qid, qname, names, ttl), or None for malformed / SERVFAIL-like replies
+        try:
+            qid, flags, qdcount, ancount = struct.unpack(">HHHH", data[:8])
+            rcode = flags & 0x000F
+            if rcode not in (0, 3) or qdcount != 1:
+                return None
+            qname, offset = cls._read_name(data, 12)
+            offset += 4
+            if rcode == 3:
+                return qid, qname, [], PTR_NEGATIVE_TTL
+            names, ttls = [], []
+            for _ in range(ancount):
+                _, offset = cls._read_name(data, offset)
+                rtype, _, ttl, rdlen = struct.unpack(">HHIH", data[offset:offset + 10])
+                offset += 10
+                if rtype == 12:
+                    name, _ = cls._read_name(data, offset)
+                    if name:
+                        names.append(name)
+                        ttls.append(ttl)
+                offset += rdlen
+            if not names:
+                return qid, qname, [], PTR_NEGATIVE_TTL
+            return qid, qname, names, min(ttls)
+        except (struct.error, IndexError):
+            return None
@@ -0,0 +1,151 @@
+import gzip
+import os
+import random
+import threading
+
+import pytest
+
+import output_files
+from output_files import CompressedWriter, ExternalSorter, compress_blob
+
+
+def read_lines(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def make_lines(n, distinct, seed=0):
+    rnd = random.Random(seed)
+    return [f"host{rnd.randrange(distinct)}.example.com" for _ in range(n)]
+
+
+@pytest.mark.parametrize("name,compression", [("out.txt", "none"), ("out.txt.gz", "gzip")])
+def test_sorter_output_is_sorted_and_unique(tmp_path, name, compression):
+    lines = make_lines(5000, 800)
+    sorter = ExternalSorter(tmp_path, buffer_lines=300)
+    for i in range(0, len(lines), 17):
+        sorter.add(lines[i:i + 17])
+    out = str(tmp_path / name)
+    count = sorter.finish(out, compression)
+    assert read_lines(out) == sorted(set(lines))
+    assert count == len(set(lines))
+
+
+def test_sorter_spills_and_dedups_across_runs(tmp_path):
+    sorter = ExternalSorter(tmp_path, buffer_lines=4)
+    sorter.add(["b", "a", "c", "a"])
+    sorter.add(["c", "d", "b", "e"])
+    sorter.add(["a"])
+    assert len(os.listdir(sorter.tmp_dir)) == 2
+    out = str(tmp_path / "out.txt")
+    assert sorter.finish(out, "none") == 5
+    assert read_lines(out) == ["a", "b", "c", "d", "e"]
+
+
+def test_sorter_collapses_runs_beyond_fan_in(tmp_path, monkeypatch):
+    merges = []
+    real_merge = ExternalSorter._merge_unique
+
+    def counting_merge(iterables, out):
+        merges.append(len(iterables))
+        return real_merge(iterables, out)
+
+    monkeypatch.setattr(ExternalSorter, "_merge_unique", staticmethod(counting_merge))
+    lines = make_lines(2000, 500, seed=1)
+    sorter = ExternalSorter(tmp_path, buffer_lines=50, fan_in=3)
+    for i in range(0, len(lines), 10):
+        sorter.add(lines[i:i + 10])
+    out = str(tmp_path / "out.txt")
+    sorter.finish(out, "none")
+    assert read_lines(out) == sorted(set(lines))
+    assert max(merges) <= 3
+    assert len(merges) > 1
+
+
+def test_sorter_removes_temp_dir(tmp_path):
+    sorter = ExternalSorter(tmp_path, buffer_lines=2)
+    sorter.add(["x", "y", "z"])
+    sorter.finish(str(tmp_path / "out.txt"), "none")
+    assert not os.path.exists(sorter.tmp_dir)
+
+
+def test_sorter_add_after_finish_raises(tmp_path):
+    sorter = ExternalSorter(tmp_path)
+    sorter.add(["a"])
+    sorter.finish(str(tmp_path / "out.txt"), "none")
+    with pytest.raises(RuntimeError):
+        sorter.add(["b"])
+
+
+def test_sorter_finish_waits_for_inflight_spill(tmp_path, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    real_write = ExternalSorter._write_run
+
+    def slow_write(self, lines):
+        started.set()
+        release.wait(5)
+        return real_write(self, lines)
+
+    monkeypatch.setattr(ExternalSorter, "_write_run", slow_write)
+    sorter = ExternalSorter(tmp_path, buffer_lines=2)
+    spill = threading.Thread(target=sorter.add, args=(["b", "a"],))
+    spill.start()
+    assert started.wait(5)
+
+    out = str(tmp_path / "out.txt")
+    result = []
+    finisher = threading.Thread(target=lambda: result.append(sorter.finish(out, "none")))
+    finisher.start()
+    finisher.join(0.2)
+    assert finisher.is_alive()   # blocked on the spill
+    release.set()
+    spill.join(5)
+    finisher.join(5)
+    assert result == [2]
+    assert read_lines(out) == ["a", "b"]
+
+
+def test_compressed_writer_single_stream(tmp_path):
+    lines = [f"sub{i % 50}.example.com" for i in range(5000)]
+    single = str(tmp_path / "single.gz")
+    writer = CompressedWriter(single, "gzip")
+    for i in range(0, len(lines), 8):
+        writer.write(lines[i:i + 8])
+    writer.close()
+
+    members = str(tmp_path / "members.gz")
+    with open(members, "ab") as f:
+        for i in range(0, len(lines), 8):
+            f.write(compress_blob("".join(ln + "\n" for ln in lines[i:i + 8]), "gzip"))
+
+    assert read_lines(single) == lines
+    assert os.path.getsize(single) * 10 < os.path.getsize(members)
+
+
+def test_compressed_writer_late_write_after_close(tmp_path):
+    path = str(tmp_path / "out.gz")
+    writer = CompressedWriter(path, "gzip")
+    writer.write(["a.example.com"])
+    writer.close()
+    writer.write(["late.example.com"])
+    assert read_lines(path) == ["a.example.com", "late.example.com"]
+
+
+def test_compressed_writer_zstd(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    path = str(tmp_path / "out.zst")
+    writer = CompressedWriter(path, "zstd")
+    writer.write(["a.example.com", "b.example.com"])
+    writer.close()
+    with open(path, "rb") as f:
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(f.read())
+    assert data.decode().splitlines() == ["a.example.com", "b.example.com"]
+
+
+def test_sorter_temp_dir_cleaned_at_exit(tmp_path):
+    sorter = ExternalSorter(tmp_path, buffer_lines=1)
+    sorter.add(["a"])
+    assert sorter.tmp_dir in output_files._live_tmp_dirs
+    output_files._cleanup_tmp_dirs()
+    assert not os.path.exists(sorter.tmp_dir)
@@ -0,0 +1,151 @@
+import socket
+import struct
+import threading
+
+import reverse_dns
+from reverse_dns import BulkPTRResolver, PTRCache, reverse_name
+
+
+class StubDNS:
+    """Loopback UDP DNS server; `answers` maps a reverse name to a PTR name,
+    None (NXDOMAIN) or a list of actions consumed per query ("drop")."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.queries = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                data, addr = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            qname, _ = BulkPTRResolver._read_name(data, 12)
+            self.queries.append(qname)
+            answer = self.answers.get(qname)
+            if isinstance(answer, list):
+                answer = answer.pop(0) if answer else None
+            if answer == "drop":
+                continue
+            self.sock.sendto(build_reply(data, answer), addr)
+
+
+def build_reply(query, ptr_name, ttl=120):
+    qid = query[:2]
+    question = query[12:]
+    if ptr_name is None:
+        return qid + struct.pack(">HHHHH", 0x8183, 1, 0, 0, 0) + question
+    rdata = b"".join(bytes([len(p)]) + p.encode() for p in ptr_name.split(".")) + b"\x00"
+    answer = b"\xc0\x0c" + struct.pack(">HHIH", 12, 1, ttl, len(rdata)) + rdata
+    return qid + struct.pack(">HHHHH", 0x8180, 1, 1, 0, 0) + question + answer
+
+
+def test_bulk_resolver_answer_and_nxdomain():
+    answers = {reverse_name("192.0.2.1"): "host.example.com", reverse_name("192.0.2.2"): None}
+    with StubDNS(answers) as stub:
+        resolver = BulkPTRResolver.from_spec(f"127.0.0.1:{stub.port}")
+        results = resolver.resolve_many(["192.0.2.1", "192.0.2.2"])
+    assert results == {
+        "192.0.2.1": (["host.example.com"], 120),
+        "192.0.2.2": ([], reverse_dns.PTR_NEGATIVE_TTL),
+    }
+
+
+def test_bulk_resolver_retries_after_timeout():
+    answers = {reverse_name("192.0.2.3"): ["drop", "late.example.com"]}
+    with StubDNS(answers) as stub:
+        resolver = BulkPTRResolver("127.0.0.1", stub.port, timeout=0.2, retries=1)
+        results = resolver.resolve_many(["192.0.2.3"])
+    assert results == {"192.0.2.3": (["late.example.com"], 120)}
+    assert stub.queries == [reverse_name("192.0.2.3")] * 2
+
+
+def test_bulk_resolver_gives_up_without_caching_timeouts():
+    answers = {reverse_name("192.0.2.4"): ["drop", "drop"]}
+    with StubDNS(answers) as stub:
+        resolver = BulkPTRResolver("127.0.0.1", stub.port, timeout=0.2, retries=1)
+        assert resolver.resolve_many(["192.0.2.4"]) == {}
+
+
+def test_bulk_resolver_rejects_reply_for_other_name():
+    # Answers with the right ID but the question of a different IP
+    class Mismatch(StubDNS):
+        def _serve(self):
+            while not self._stop.is_set():
+                try:
+                    data, addr = self.sock.recvfrom(512)
+                except socket.timeout:
+                    continue
+                other = BulkPTRResolver._build_query(struct.unpack(">H", data[:2])[0], "198.51.100.9")
+                self.sock.sendto(build_reply(other, "wrong.example.com"), addr)
+
+    with Mismatch({}) as stub:
+        resolver = BulkPTRResolver("127.0.0.1", stub.port, timeout=0.2, retries=0)
+        assert resolver.resolve_many(["192.0.2.5"]) == {}
+
+
+def test_bulk_resolver_ignores_other_sources():
+    # Replies come back from a different port than the one queried
+    class OtherPort(StubDNS):
+        def _serve(self):
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as other:
+                while not self._stop.is_set():
+                    try:
+                        data, addr = self.sock.recvfrom(512)
+                    except socket.timeout:
+                        continue
+                    other.sendto(build_reply(data, "spoofed.example.com"), addr)
+
+    with OtherPort({}) as stub:
+        resolver = BulkPTRResolver("127.0.0.1", stub.port, timeout=0.2, retries=0)
+        assert resolver.resolve_many(["192.0.2.6"]) == {}
+
+
+def test_bulk_resolver_skips_work_when_stopped():
+    stop = threading.Event()
+    stop.set()
+    with StubDNS({}) as stub:
+        resolver = BulkPTRResolver("127.0.0.1", stub.port, timeout=0.2)
+        assert resolver.resolve_many(["192.0.2.7"], stop=stop) == {}
+    assert stub.queries == []
+
+
+def test_cache_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(reverse_dns.time, "monotonic", lambda: now[0])
+    cache = PTRCache()
+    cache.put("192.0.2.1", ["a.example.com"], ttl=10)
+    cache.put("192.0.2.2", [], ttl=5)
+    assert cache.get("192.0.2.1") == ["a.example.com"]
+    assert cache.get("192.0.2.2") == []
+    now[0] += 6
+    assert cache.get("192.0.2.2") is None
+    assert cache.get("192.0.2.1") == ["a.example.com"]
+    now[0] += 5
+    assert cache.get("192.0.2.1") is None
+
+
+def test_cache_lru_eviction():
+    cache = PTRCache(maxsize=2)
+    cache.put("a", ["x"], ttl=60)
+    cache.put("b", ["y"], ttl=60)
+    assert cache.get("a") == ["x"]       # "b" is now least recently used
+    cache.put("c", ["z"], ttl=60)
+    assert cache.get("b") is None
+    assert cache.get("a") == ["x"]
+    assert cache.get("c") == ["z"]